@@ -3,13 +3,54 @@ Sales Analytics Dashboard - Streamlit Version
 Clean, working, beautiful dashboard that actually displays data
 """
 
+import hashlib
+import importlib.util
+import io
+import os
+import re
+import tempfile
+from pathlib import Path
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
 import numpy as np
 
+try:
+    import numbagg  # optional: numba-parallel grouped reductions
+except ImportError:
+    numbagg = None
+try:
+    from numba import njit  # optional: installed alongside numbagg
+except ImportError:
+    njit = None
+
+# Copy-on-write: slices and column subsets of the shared frame stay lazy
+# views, copied only if something writes to them
+pd.options.mode.copy_on_write = True
+
+# Cleaned uploads are persisted here as Parquet so restarts skip Excel parsing
+CACHE_DIR = Path.home() / '.cache' / 'salestrends'
+# Bump whenever load_data's output changes, so stale sidecars are not reused
+CACHE_VERSION = 13
+# Sidecars kept on disk; older ones are evicted least-recently-used first
+CACHE_MAX_FILES = 8
+
+# Columns of the 'Final Sale Data' sheet the dashboard uses (see COLUMN_MAPPING.md);
+# the rest of the sheet is never parsed
+SOURCE_COLUMNS = [
+    'Final Order date', 'Main Parties', 'Group Name', 'Item Desc', 'Alias',
+    'Sale (Qty.)', 'Sale Return (Qty.)', 'Sale (Amt.)', 'Sale Return (Amt.)'
+]
+TEXT_COLUMNS = {'Main Parties': str, 'Group Name': str, 'Item Desc': str, 'Alias': str}
+# Rust-backed calamine parses xlsx many times faster than openpyxl (pandas >= 2.2)
+EXCEL_ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+
+# Render limits that keep Plotly and the tables responsive on large catalogs
+TREEMAP_TOP_CATEGORIES = 8   # per platform; the rest are folded into "Other"
+PRODUCT_TABLE_PAGE = 500     # product rows shown per "Show more" click
+RAW_PREVIEW_ROWS = 1000      # raw rows sent to the browser; the rest via CSV export
+
 # Page config
 # Page config
 st.set_page_config(
@@ -20,7 +61,7 @@ st.set_page_config(
 )
 
 # Custom CSS - Executive Dashboard Style
-st.markdown("""
+CUSTOM_CSS = """
 <style>
     /* Main background */
     .main {
@@ -134,18 +175,77 @@ st.markdown("""
         font-weight: 600 !important;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+# Sent on every rerun, so strip comments and indentation once at import
+CUSTOM_CSS = re.sub(r'/\*.*?\*/', '', CUSTOM_CSS, flags=re.S)
+CUSTOM_CSS = re.sub(r'\s*([{};])\s*', r'\1', re.sub(r'\s+', ' ', CUSTOM_CSS)).strip()
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+
+# Landing text shown until a workbook is uploaded
+WELCOME_MD = """
+#### Sales Dashboard
+Upload your Excel file to view insights.
+
+**Available Modules:**
+*   **Overview**: High-level sales performance.
+*   **Platform Analysis**: Channel and distribution metrics.
+*   **Product Analysis**: SKU-level performance.
+"""
 
 # Load data
-@st.cache_data
-def load_data(uploaded_file):
-    """Load and clean the Excel data from uploaded file"""
-    if uploaded_file is None:
+def file_fingerprint(file_bytes):
+    """Content hash of an uploaded file, used to key on-disk caches"""
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+def save_sidecar(df, parquet_path):
+    """Atomically write ``df`` to ``parquet_path``, then evict old sidecars"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file first so readers never see a partial Parquet file
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, engine='pyarrow', compression='zstd')
+        os.replace(tmp_path, parquet_path)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+    
+    sidecars = sorted(
+        (p for p in CACHE_DIR.glob('*.parquet') if not p.name.endswith('.rollup.parquet')),
+        key=lambda p: p.stat().st_mtime, reverse=True
+    )
+    for stale in sidecars[CACHE_MAX_FILES:]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix('.rollup.parquet').unlink(missing_ok=True)
+
+def load_data(data_key, _file_bytes, name):
+    """Load and clean the Excel data from uploaded file bytes.
+
+    ``data_key`` is the bytes' file_fingerprint; it names the Parquet
+    sidecar, so re-uploading the same workbook skips Excel parsing.
+    """
+    if not _file_bytes:
         return None
     
+    parquet_path = CACHE_DIR / f"{data_key}.v{CACHE_VERSION}.parquet"
+    if parquet_path.exists():
+        try:
+            df = pd.read_parquet(parquet_path, engine='pyarrow')
+            os.utime(parquet_path)  # mark as recently used for eviction
+            return df
+        except Exception:
+            # Truncated or corrupt sidecar: drop it and rebuild from the workbook
+            parquet_path.unlink(missing_ok=True)
+    
     try:
         # Load from uploaded file - use 'Final Sale Data' sheet with 128K+ rows
-        df = pd.read_excel(uploaded_file, sheet_name='Final Sale Data')
+        # Headers can carry stray whitespace, so match them stripped
+        df = pd.read_excel(
+            io.BytesIO(_file_bytes),
+            sheet_name='Final Sale Data',
+            engine=EXCEL_ENGINE,
+            usecols=lambda col: str(col).strip() in SOURCE_COLUMNS,
+            dtype=TEXT_COLUMNS
+        )
         
         # Clean column names
         df.columns = df.columns.str.strip()
@@ -153,78 +253,435 @@ def load_data(uploaded_file):
         # Primary date column (from Excel analysis)
         date_col = 'Final Order date'
         if date_col in df.columns:
-            df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+            # The parser already yields datetime64 for clean date columns; only text
+            # or mixed cells need converting (cache=True parses repeated strings once)
+            if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+                df[date_col] = pd.to_datetime(df[date_col], errors='coerce', cache=True)
             
-            # Add fiscal year column (March-February)
-            df['Fiscal Year'] = df[date_col].apply(
-                lambda x: f"FY{x.year}-{str(x.year+1)[-2:]}" if pd.notna(x) and x.month >= 3 
-                else f"FY{x.year-1}-{str(x.year)[-2:]}" if pd.notna(x) else None
+            # Add fiscal year column (March-February), vectorized over the whole column:
+            # label only the distinct start years, then map rows to them by code
+            dates = df[date_col]
+            valid = dates.notna().to_numpy()
+            year = dates.dt.year.fillna(0).to_numpy(dtype=int)
+            start = np.where(dates.dt.month.to_numpy() >= 3, year, year - 1)
+            fy_starts = np.unique(start[valid])
+            df['Fiscal Year'] = pd.Categorical.from_codes(
+                np.where(valid, np.searchsorted(fy_starts, start), -1),
+                categories=[f"FY{y}-{(y + 1) % 100:02d}" for y in fy_starts]
             )
             
-            # Add month column for filtering
-            df['Month'] = df[date_col].dt.strftime('%B %Y')
+            # Add month column for filtering: strftime only the distinct months
+            month_key = dates.to_numpy().astype('datetime64[M]')
+            months = np.unique(month_key[valid])
+            df['Month'] = pd.Categorical.from_codes(
+                np.where(valid, np.searchsorted(months, month_key), -1),
+                categories=pd.DatetimeIndex(months).strftime('%B %Y')
+            )
             df['Month_Num'] = df[date_col].dt.to_period('M')
+            
+            # Keep rows in date order (undated last) so date ranges are contiguous slices
+            df = df.sort_values(date_col, kind='mergesort', ignore_index=True)
         
-        # Ensure numeric columns
+        # Ensure numeric columns (float32 is plenty for sales figures, half the bandwidth)
         numeric_cols = ['Sale (Qty.)', 'Sale Return (Qty.)', 'Sale (Amt.)', 'Sale Return (Amt.)']
         for col in numeric_cols:
             if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+                df[col] = pd.to_numeric(df[col], errors='coerce', downcast='float').fillna(0).astype('float32')
         
-        # Calculate net values
+        # Calculate net values straight into float32 arrays, no intermediate Series
         if 'Sale (Amt.)' in df.columns and 'Sale Return (Amt.)' in df.columns:
-            df['Net Revenue'] = df['Sale (Amt.)'] - df['Sale Return (Amt.)']
+            df['Net Revenue'] = np.subtract(df['Sale (Amt.)'].to_numpy(), df['Sale Return (Amt.)'].to_numpy(), dtype=np.float32)
         
         if 'Sale (Qty.)' in df.columns and 'Sale Return (Qty.)' in df.columns:
-            df['Net Quantity'] = df['Sale (Qty.)'] - df['Sale Return (Qty.)']
+            df['Net Quantity'] = np.subtract(df['Sale (Qty.)'].to_numpy(), df['Sale Return (Qty.)'].to_numpy(), dtype=np.float32)
+        
+        # Text columns can mix numbers and strings (numeric SKU aliases are common);
+        # normalise them to str so they sort, categorise and serialise consistently
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
         
-        # Map Excel columns to dashboard field names
-        df['Platform'] = df['Main Parties'] if 'Main Parties' in df.columns else None
-        df['Category'] = df['Group Name'] if 'Group Name' in df.columns else None
-        df['Product'] = df['Item Desc'] if 'Item Desc' in df.columns else None
-        df['SKU'] = df['Alias'] if 'Alias' in df.columns else None
+        # Map Excel columns to dashboard field names; renaming moves the data
+        # instead of keeping a second copy under each name
+        field_names = {'Main Parties': 'Platform', 'Group Name': 'Category', 'Item Desc': 'Product', 'Alias': 'SKU'}
+        df = df.rename(columns=field_names)
+        for col in field_names.values():
+            if col not in df.columns:
+                df[col] = None
+        
+        # Low-cardinality text columns as categoricals: smaller, faster groupby/isin
+        for col in ['Platform', 'Category', 'Product', 'SKU', 'Fiscal Year', 'Month']:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        
+        # Persist the cleaned frame; a failed write only costs the next reload
+        try:
+            save_sidecar(df, parquet_path)
+        except Exception as e:
+            st.warning(f"⚠️ Could not cache {name} to disk ({e}); it will be re-parsed after a restart.")
         
         return df
         
     except Exception as e:
-        st.error(f"❌ Error loading Excel file: {str(e)}")
+        st.error(f"❌ Error loading {name}: {str(e)}")
         st.info("💡 Make sure your Excel file has a 'Sheet1' with the correct column structure.")
         return None
 
-# Generate insights
-def generate_insights(df, filtered_df):
-    """Auto-generate smart insights from the data"""
-    insights = []
+@st.cache_resource(show_spinner="Loading data...", max_entries=4)
+def get_df(data_key, _file_bytes, name):
+    """The loaded frame for an upload, shared by every rerun and session.
+
+    Unlike cache_data, cache_resource hands back the same object instead of
+    unpickling a copy per rerun, so callers must treat it as read-only.
+    """
+    return load_data(data_key, _file_bytes, name)
+
+# Dimensions the rollup is grouped by; filters on anything else need the raw rows
+ROLLUP_KEYS = ['Platform', 'Category', 'Fiscal Year', 'Month']
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def get_rollup(data_key, _df):
+    """Platform x Category x Fiscal Year x Month totals for an upload.
+
+    A few thousand rows instead of the raw 128K, persisted next to the data
+    sidecar. Returns None when the data has no order dates.
+    """
+    if _df is None or not all(key in _df.columns for key in ROLLUP_KEYS):
+        return None
+    
+    # The rollup stands in for the full-date-range selection, which excludes
+    # undated rows (sorted last by load_data). Rows missing a Platform or
+    # Category still count towards the totals, so their keys stay as NaN groups.
+    dated = _df.iloc[:int(_df['Final Order date'].notna().sum())]
+    
+    rollup_path = CACHE_DIR / f"{data_key}.v{CACHE_VERSION}.rollup.parquet"
+    if rollup_path.exists():
+        try:
+            return pd.read_parquet(rollup_path, engine='pyarrow')
+        except Exception:
+            rollup_path.unlink(missing_ok=True)
+    
+    rollup = group_sums(
+        dated, ROLLUP_KEYS,
+        ['Net Revenue', 'Net Quantity', 'Sale (Amt.)', 'Sale Return (Amt.)'],
+        size='Orders', dropna=False
+    ).reset_index()
+    # First day of each Month label, so the trend chart can be drawn from the rollup
+    months = rollup['Month'].cat
+    rollup['Month Start'] = pd.to_datetime(months.categories, format='%B %Y')[months.codes]
+    try:
+        save_sidecar(rollup, rollup_path)
+    except Exception:
+        pass  # the in-process cache still serves this session
+    return rollup
+
+# Filters and aggregations
+def column_total(df, col):
+    """Sum of a (float32) column, accumulated in float64"""
+    return float(np.sum(df[col].to_numpy(), dtype=np.float64))
+
+# Columns summed for the overview KPIs
+KPI_COLUMNS = ['Net Revenue', 'Net Quantity', 'Sale (Amt.)', 'Sale Return (Amt.)']
+
+if njit is not None:
+    # Serial on purpose: Streamlit runs sessions in threads, and numba's
+    # parallel threading layers are not all safe for concurrent callers
+    @njit(fastmath=True, cache=True, nogil=True)
+    def _fused_sums(a, b, c, d):
+        sa = sb = sc = sd = 0.0
+        for i in range(a.size):
+            sa += a[i]
+            sb += b[i]
+            sc += c[i]
+            sd += d[i]
+        return sa, sb, sc, sd
+
+def kpi_totals(df):
+    """Float64 totals of KPI_COLUMNS, in one pass over the rows when numba is installed"""
+    if njit is None:
+        return tuple(column_total(df, col) for col in KPI_COLUMNS)
+    return _fused_sums(*(df[col].to_numpy() for col in KPI_COLUMNS))
+
+def overview_kpis(df):
+    """Revenue, quantity, order count and AOV, from raw rows or rollup rows"""
+    revenue, qty, _, _ = kpi_totals(df)
+    orders = int(df['Orders'].sum()) if 'Orders' in df.columns else len(df)
+    aov = revenue / orders if orders > 0 else 0
+    return revenue, qty, orders, aov
+
+def group_sums(df, keys, columns, size=None, dropna=True):
+    """Sum ``columns`` per observed combination of the categorical ``keys``.
+
+    ``size`` optionally names an extra output column holding each group's
+    row count. With ``dropna=False`` rows with a missing key form their own
+    NaN group instead of being left out. Runs numbagg's multi-threaded
+    grouped kernels over the category codes when numbagg is installed,
+    otherwise a pandas groupby. Either way float sums are accumulated in
+    float64; integer columns stay integers.
+    """
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    integer_columns = [col for col in columns if pd.api.types.is_integer_dtype(df[col])]
+    if numbagg is None or not all(isinstance(df[k].dtype, pd.CategoricalDtype) for k in keys):
+        # groupby().sum() keeps float32, so upcast the summed columns first
+        frame = df[keys + columns].astype({col: 'float64' for col in columns if col not in integer_columns})
+        grouped = frame.groupby(keys, observed=True, dropna=dropna)
+        result = grouped[columns].sum()
+        if size is not None:
+            result[size] = grouped.size()
+        return result
     
-    if len(filtered_df) == 0:
+    # Fold the key columns' category codes into one flat group label; when
+    # keeping missing keys, code -1 is shifted to a group of its own
+    shift = 0 if dropna else 1
+    sizes = [len(df[k].cat.categories) + shift for k in keys]
+    labels = np.zeros(len(df), dtype=np.int64)
+    valid = np.ones(len(df), dtype=bool)
+    for k, num_categories in zip(keys, sizes):
+        codes = df[k].cat.codes.to_numpy().astype(np.int64) + shift
+        valid &= codes >= 0
+        labels = labels * num_categories + codes
+    labels[~valid] = -1
+    num_labels = int(np.prod(sizes))
+    group_sizes = np.bincount(labels[valid], minlength=num_labels)
+    observed = np.flatnonzero(group_sizes)
+    
+    result = pd.DataFrame({
+        col: numbagg.group_nansum(df[col].to_numpy(np.float64), labels, num_labels=num_labels)[observed]
+        for col in columns
+    })
+    for col in integer_columns:
+        result[col] = result[col].round().astype(np.int64)
+    if size is not None:
+        result[size] = group_sizes[observed]
+    
+    levels = [
+        pd.CategoricalIndex(pd.Categorical.from_codes(codes - shift, categories=df[k].cat.categories), name=k)
+        for k, codes in zip(keys, np.unravel_index(observed, sizes))
+    ]
+    result.index = levels[0] if len(levels) == 1 else pd.MultiIndex.from_arrays(levels)
+    return result
+
+# Cached per (upload, filter selection). Frames are passed as underscore
+# arguments so Streamlit skips hashing them; data_key/filter_key identify them.
+# Only row positions and small aggregates are cached: cache_data unpickles a
+# fresh copy of its value on every hit, which is costly for whole frames.
+@st.cache_data(show_spinner=False, max_entries=64)
+def filter_rows(_df, data_key, fiscal_year='All', month='All', platforms=('All',),
+                categories=('All',), product='All', date_range=None):
+    """Positions of the rows matching the sidebar selections.
+
+    A slice when they are one contiguous run, e.g. only the date range is set,
+    so iloc returns a view and the cache stores no position array.
+    """
+    lo, hi = 0, len(_df)
+    if date_range is not None:
+        # load_data sorts rows by order date, so the range is one contiguous
+        # slice found by binary search; the other masks only scan that slice
+        lo, hi = np.searchsorted(_df['Final Order date'].to_numpy(), [
+            np.datetime64(date_range[0]),
+            np.datetime64(date_range[1]) + np.timedelta64(1, 'D')
+        ])
+    rows = _df.iloc[lo:hi]
+    
+    # One boolean mask over plain arrays, cheap equality tests before isin
+    m = np.ones(len(rows), dtype=bool)
+    if fiscal_year != 'All':
+        m &= (rows['Fiscal Year'] == fiscal_year).to_numpy()
+    if month != 'All':
+        m &= (rows['Month'] == month).to_numpy()
+    if product != 'All':
+        m &= (rows['Product'] == product).to_numpy()
+    if 'All' not in platforms and platforms:
+        m &= rows['Platform'].isin(platforms).to_numpy()
+    if 'All' not in categories and categories:
+        m &= rows['Category'].isin(categories).to_numpy()
+    if m.all():
+        return slice(int(lo), int(hi))
+    return lo + np.flatnonzero(m)
+
+def apply_filters(df, data_key, *filters):
+    """Rows of the loaded data matching the sidebar selections"""
+    return df.iloc[filter_rows(df, data_key, *filters)]
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def filter_options(_df, data_key):
+    """Sorted option lists and the date bounds of an upload, scanned once for all sessions"""
+    options = {
+        col: sorted(_df[col].dropna().unique().tolist())
+        for col in ['Platform', 'Category', 'Product', 'Fiscal Year', 'Month'] if col in _df.columns
+    }
+    if 'Final Order date' in _df.columns:
+        options['date_bounds'] = (_df['Final Order date'].min(), _df['Final Order date'].max())
+    return options
+
+def filter_choices(df, data_key, column, *filters):
+    """Values of ``column`` left after the given upstream filters"""
+    return df[column].iloc[filter_rows(df, data_key, *filters)].dropna().unique().tolist()
+
+def revenue_trend(df):
+    """Monthly net revenue for the trend chart, from raw rows or rollup rows"""
+    revenue = df['Net Revenue'].to_numpy(np.float64)
+    if 'Month Start' in df.columns:
+        time_data = pd.Series(revenue).groupby(df['Month Start'].to_numpy(), sort=True).sum()
+    else:
+        # Raw rows keep load_data's date order (undated last), so each month is
+        # one contiguous run: sum the runs in a single reduceat pass
+        month_key = df['Final Order date'].to_numpy().astype('datetime64[M]')
+        dated = len(month_key) - np.count_nonzero(np.isnat(month_key))
+        month_key, revenue = month_key[:dated], revenue[:dated]
+        starts = np.flatnonzero(np.r_[True, month_key[1:] != month_key[:-1]])
+        sums = np.add.reduceat(revenue, starts) if dated else np.zeros(0)
+        time_data = pd.Series(sums, index=month_key[starts[:len(sums)]])
+    if not time_data.empty:
+        # Keep months without sales on the axis as zero, as the Grouper did
+        time_data = time_data.reindex(pd.date_range(time_data.index[0], time_data.index[-1], freq='MS'), fill_value=0)
+    time_data = time_data.reset_index()
+    time_data.columns = ['Final Order date', 'Net Revenue']
+    return time_data
+
+def platform_agg(df):
+    """Per-platform totals, AOV and return rate in a single groupby pass.
+
+    ``df`` may be raw rows or rollup rows, which carry an Orders count.
+    """
+    sums = ['Net Revenue', 'Net Quantity', 'Sale (Amt.)', 'Sale Return (Amt.)']
+    if 'Orders' in df.columns:
+        platform_metrics = group_sums(df, 'Platform', sums + ['Orders'])
+    else:
+        platform_metrics = group_sums(df, 'Platform', sums, size='Orders')
+    platform_metrics = platform_metrics.reset_index()
+    platform_metrics['AOV'] = platform_metrics['Net Revenue'] / platform_metrics['Orders']
+    platform_metrics['Return Rate (%)'] = (platform_metrics['Sale Return (Amt.)'] / platform_metrics['Sale (Amt.)']) * 100
+    return platform_metrics
+
+def channel_mix(df):
+    """Positive net revenue per (Platform, Category) for the treemap, top categories only.
+
+    Works on raw rows or rollup rows alike.
+    """
+    tree_data = group_sums(df, ['Platform', 'Category'], ['Net Revenue']).reset_index()
+    tree_data = tree_data[tree_data['Net Revenue'] > 0]
+    
+    # Keep the top categories of each platform; fold the long tail into "Other"
+    rank = tree_data.groupby('Platform', observed=True, sort=False)['Net Revenue'].rank(method='first', ascending=False)
+    tree_data = tree_data.assign(
+        Category=tree_data['Category'].astype(str).where(rank <= TREEMAP_TOP_CATEGORIES, 'Other')
+    )
+    return tree_data.groupby(['Platform', 'Category'], observed=True, sort=False, as_index=False)['Net Revenue'].sum()
+
+def product_stats(df):
+    """Per-product net revenue and quantity, unordered; see top_rows"""
+    return group_sums(df, 'Product', ['Net Revenue', 'Net Quantity'])
+
+def top_rows(df, col, n):
+    """The ``n`` rows with the largest ``col``, largest first.
+
+    argpartition picks them in O(len(df)), so only those ``n`` get sorted.
+    """
+    values = -df[col].to_numpy()
+    if n < len(values):
+        picked = np.argpartition(values, n)[:n]
+        return df.iloc[picked[np.argsort(values[picked], kind='stable')]]
+    return df.iloc[np.argsort(values, kind='stable')]
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def compute_aggregates(_summary_df, _filtered_df, data_key, filter_key):
+    """Every KPI and chart aggregate for one filter selection, as one cached bundle.
+
+    ``_summary_df`` may be rollup rows; the product figures need the raw
+    ``_filtered_df``.
+    """
+    return {
+        'kpis': overview_kpis(_summary_df),
+        'trend': revenue_trend(_summary_df) if 'Final Order date' in _filtered_df.columns else None,
+        'platforms': platform_agg(_summary_df),
+        'channel_mix': channel_mix(_summary_df),
+        'products': product_stats(_filtered_df),
+    }
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def filtered_csv(_filtered_df, data_key, filter_key):
+    """The filtered rows as UTF-8 CSV bytes for the raw data export"""
+    return _filtered_df.to_csv(index=False).encode('utf-8')
+
+# Generate insights
+def generate_insights(aggregates):
+    """Auto-generate smart insights from a compute_aggregates bundle, as Markdown lines"""
+    _, _, orders, avg_order_value = aggregates['kpis']
+    if orders == 0:
         return ["No data matches the selected filters."]
     
     # Revenue insight
-    total_revenue = filtered_df['Net Revenue'].sum() if 'Net Revenue' in filtered_df.columns else 0
-    avg_order_value = total_revenue / len(filtered_df) if len(filtered_df) > 0 else 0
-    insights.append(f"Average Order Value: **₹{avg_order_value:,.0f}**")
+    insights = [f"Average Order Value: **₹{avg_order_value:,.0f}**"]
     
     # Top platform
-    if 'Platform' in filtered_df.columns:
-        top_platform = filtered_df.groupby('Platform')['Net Revenue'].sum().idxmax()
-        top_platform_revenue = filtered_df.groupby('Platform')['Net Revenue'].sum().max()
-        insights.append(f"Top Platform: **{top_platform}** (₹{top_platform_revenue:,.0f})")
+    platforms = aggregates['platforms'].set_index('Platform')
+    if not platforms.empty:
+        top_platform = platforms['Net Revenue'].idxmax()
+        insights.append(f"Top Platform: **{top_platform}** (₹{platforms.loc[top_platform, 'Net Revenue']:,.0f})")
     
     # Return rate
-    if 'Sale (Amt.)' in filtered_df.columns and 'Sale Return (Amt.)' in filtered_df.columns:
-        total_sales = filtered_df['Sale (Amt.)'].sum()
-        total_returns = filtered_df['Sale Return (Amt.)'].sum()
-        return_rate = (total_returns / total_sales * 100) if total_sales > 0 else 0
-        insights.append(f"Return Rate: **{return_rate:.1f}%**")
+    total_sales = platforms['Sale (Amt.)'].sum()
+    total_returns = platforms['Sale Return (Amt.)'].sum()
+    return_rate = (total_returns / total_sales * 100) if total_sales > 0 else 0
+    insights.append(f"Return Rate: **{return_rate:.1f}%**")
     
     # Top product
-    if 'Product' in filtered_df.columns:
-        top_product = filtered_df.groupby('Product')['Net Revenue'].sum().nlargest(1)
-        if not top_product.empty:
-            insights.append(f"Best Seller: **{top_product.index[0]}** (₹{top_product.values[0]:,.0f})")
+    products = aggregates['products']
+    if not products.empty:
+        top_product = products['Net Revenue'].idxmax()
+        insights.append(f"Best Seller: **{top_product}** (₹{products.loc[top_product, 'Net Revenue']:,.0f})")
     
     return insights
 
+# Fragments: their own widgets ("Show more", the CSV export toggle) rerun just
+# that section instead of the whole script
+def show_more_products():
+    """'Show more' callback: grow the product table by one page"""
+    st.session_state.product_rows = st.session_state.get('product_rows', PRODUCT_TABLE_PAGE) + PRODUCT_TABLE_PAGE
+
+@st.fragment
+def product_table(prod_stats):
+    """Paged per-product table, highest revenue first"""
+    with st.expander("🔎 View Detailed Product Performance"):
+        shown = st.session_state.setdefault('product_rows', PRODUCT_TABLE_PAGE)
+        # A progress bar column replaces Styler.background_gradient, which builds
+        # a CSS string per cell in Python
+        grid_df = top_rows(prod_stats, 'Net Revenue', shown).assign(**{'Revenue Bar': lambda d: d['Net Revenue']})
+        st.dataframe(
+            grid_df,
+            column_config={
+                'Net Revenue': st.column_config.NumberColumn(format="₹%.0f"),
+                'Net Quantity': st.column_config.NumberColumn(format="%.0f"),
+                'Revenue Bar': st.column_config.ProgressColumn(
+                    format="₹%.0f",
+                    min_value=0,
+                    max_value=max(float(prod_stats['Net Revenue'].max()), 1.0)
+                ),
+            },
+            use_container_width=True,
+            height=500
+        )
+        if len(prod_stats) > shown:
+            st.caption(f"Showing top {shown:,} of {len(prod_stats):,} products by revenue")
+            # The callback runs before the fragment reruns, so no extra rerun is needed
+            st.button("Show more", on_click=show_more_products)
+
+@st.fragment
+def raw_data_view(filtered_df, total_rows, data_key, filter_key):
+    """Preview of the filtered rows, with an on-request full CSV export"""
+    with st.expander("📋 View Raw Data (Filtered)"):
+        st.caption(f"Showing {min(len(filtered_df), RAW_PREVIEW_ROWS):,} of {len(filtered_df):,} rows "
+                   f"(filtered from {total_rows:,} total rows)")
+        st.dataframe(filtered_df.head(RAW_PREVIEW_ROWS), use_container_width=True, height=400)
+        # The full selection only crosses the wire on request, not on every rerun
+        if len(filtered_df) > RAW_PREVIEW_ROWS and st.checkbox("Prepare full CSV export"):
+            st.download_button(
+                "Download full CSV",
+                filtered_csv(filtered_df, data_key, filter_key),
+                file_name="filtered_sales.csv",
+                mime="text/csv"
+            )
+
 # Main app
 def main():
     st.title("Analytics Dashboard")
@@ -283,85 +740,97 @@ def main():
     else:
         st.sidebar.warning("Please upload an Excel file to begin")
         st.info("👈 **Upload your Excel file in the sidebar to get started.**")
-        st.markdown("""
-        #### Sales Dashboard
-        Upload your Excel file to view insights.
-        
-        **Available Modules:**
-        *   **Overview**: High-level sales performance.
-        *   **Platform Analysis**: Channel and distribution metrics.
-        *   **Product Analysis**: SKU-level performance.
-        """)
+        st.markdown(WELCOME_MD)
         st.stop()
     
-    # Load data
-    df = load_data(uploaded_file)
+    # Load data - fingerprint each upload once, not on every rerun
+    if st.session_state.get('data_file_id') != uploaded_file.file_id:
+        st.session_state.data_key = file_fingerprint(uploaded_file.getvalue())
+        st.session_state.data_file_id = uploaded_file.file_id
+    data_key = st.session_state.data_key
+    df = get_df(data_key, uploaded_file.getvalue(), uploaded_file.name)
+    rollup = get_rollup(data_key, df)
     
     if df is None:
         st.info("Please upload your Excel file using the sidebar to view analytics")
         st.stop()
+    
+    # Plotly is only needed once there is data to chart; importing it here keeps
+    # it off the critical path of the first (upload prompt) page load
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
         
     # ------------------ GLOBAL FILTERS (CASCADING) ------------------
     st.sidebar.header("Filters")
     
-    # Create valid filter df
-    filter_df = df.copy()
+    selected_fy = selected_month = selected_product = 'All'
+    selected_platforms = selected_categories = ['All']
+    date_range = full_range = None
+    
+    # Cascading lists fall back to filter_choices once an upstream filter is set
+    uniques = filter_options(df, data_key)
     
     # Fiscal Year filter
     if 'Fiscal Year' in df.columns:
-        fiscal_years = ['All'] + sorted(df['Fiscal Year'].dropna().unique().tolist(), reverse=True)
+        fiscal_years = ['All'] + sorted(uniques['Fiscal Year'], reverse=True)
         selected_fy = st.sidebar.selectbox("Fiscal Year", fiscal_years, index=0)
-        if selected_fy != 'All':
-            filter_df = filter_df[filter_df['Fiscal Year'] == selected_fy]
 
     # Month filter
     if 'Month' in df.columns:
-        available_months = ['All'] + sorted(filter_df['Month'].dropna().unique().tolist(), reverse=True)
+        months = uniques['Month'] if selected_fy == 'All' else filter_choices(df, data_key, 'Month', selected_fy)
+        available_months = ['All'] + sorted(months, reverse=True)
         selected_month = st.sidebar.selectbox("Month", available_months, index=0)
-        if selected_month != 'All':
-            filter_df = filter_df[filter_df['Month'] == selected_month]
 
     # Platform filter
-    if 'Platform' in filter_df.columns:
-        available_platforms = ['All'] + sorted(filter_df['Platform'].dropna().unique().tolist())
+    if 'Platform' in df.columns:
+        if selected_fy == selected_month == 'All':
+            platforms = uniques['Platform']
+        else:
+            platforms = filter_choices(df, data_key, 'Platform', selected_fy, selected_month)
+        available_platforms = ['All'] + sorted(platforms)
         selected_platforms = st.sidebar.multiselect(
             "Platform", 
             available_platforms, 
             default=['All'],
             help="Select platforms - updates based on category/product selection"
         )
-        if 'All' not in selected_platforms and selected_platforms:
-            filter_df = filter_df[filter_df['Platform'].isin(selected_platforms)]
 
     # Category filter
-    if 'Category' in filter_df.columns:
-        available_categories = ['All'] + sorted(filter_df['Category'].dropna().unique().tolist())
+    if 'Category' in df.columns:
+        if selected_fy == selected_month == 'All' and 'All' in selected_platforms:
+            categories = uniques['Category']
+        else:
+            categories = filter_choices(df, data_key, 'Category', selected_fy, selected_month,
+                                        tuple(selected_platforms))
+        available_categories = ['All'] + sorted(categories)
         selected_categories = st.sidebar.multiselect(
             "Category", 
             available_categories, 
             default=['All'],
             help="Select categories - updates based on platform/product selection"
         )
-        if 'All' not in selected_categories and selected_categories:
-            filter_df = filter_df[filter_df['Category'].isin(selected_categories)]
 
     # Product filter (Optional)
     if st.sidebar.checkbox("Filter by Product/SKU"):
-        if 'Product' in filter_df.columns:
-            available_products = sorted(filter_df['Product'].dropna().unique().tolist())
+        if 'Product' in df.columns:
+            if (selected_fy == selected_month == 'All'
+                    and 'All' in selected_platforms and 'All' in selected_categories):
+                available_products = uniques['Product']
+            else:
+                available_products = sorted(filter_choices(df, data_key, 'Product', selected_fy, selected_month,
+                                                           tuple(selected_platforms), tuple(selected_categories)))
             selected_product = st.sidebar.selectbox(
                 "Product", 
                 ['All'] + available_products,
                 help="Select product - updates based on platform/category selection"
             )
-            if selected_product != 'All':
-                filter_df = filter_df[filter_df['Product'] == selected_product]
 
     # Date Range Slider
     if 'Final Order date' in df.columns:
-        min_date = df['Final Order date'].min()
-        max_date = df['Final Order date'].max()
+        min_date, max_date = uniques['date_bounds']
         if pd.notnull(min_date) and pd.notnull(max_date):
+            full_range = (min_date.date(), max_date.date())
             cols = st.sidebar.columns(1)
             date_range = cols[0].slider(
                 "Date Period",
@@ -369,12 +838,18 @@ def main():
                 max_value=max_date.date(),
                 value=(min_date.date(), max_date.date())
             )
-            filter_df = filter_df[
-                (filter_df['Final Order date'].dt.date >= date_range[0]) &
-                (filter_df['Final Order date'].dt.date <= date_range[1])
-            ]
             
-    filtered_df = filter_df
+    # Every cached section below is keyed on the upload plus this selection
+    filter_key = (selected_fy, selected_month, tuple(selected_platforms),
+                  tuple(selected_categories), selected_product, date_range)
+    filtered_df = apply_filters(df, data_key, *filter_key)
+    
+    # Without a product or narrowed date filter, the KPIs, trend and platform
+    # sections can read the small pre-aggregated rollup instead of the raw rows
+    if rollup is not None and full_range is not None and selected_product == 'All' and date_range == full_range:
+        summary_df = apply_filters(rollup, f"{data_key}:rollup", *filter_key[:4])
+    else:
+        summary_df = filtered_df
 
     # ------------------ KPI SECTION ------------------
     st.markdown("---")
@@ -382,10 +857,8 @@ def main():
     col1, col2, col3, col4 = st.columns(4)
     
     # Calculate KPIs
-    revenue = filtered_df['Net Revenue'].sum()
-    qty = filtered_df['Net Quantity'].sum()
-    orders = len(filtered_df)
-    aov = revenue / orders if orders > 0 else 0
+    aggregates = compute_aggregates(summary_df, filtered_df, data_key, filter_key)
+    revenue, qty, orders, aov = aggregates['kpis']
     
     with col1:
         st.metric("Total Revenue", f"₹{revenue:,.0f}")
@@ -395,24 +868,31 @@ def main():
         st.metric("Total Orders", f"{orders:,.0f}")
     with col4:
         st.metric("Avg. Order Value", f"₹{aov:,.0f}")
-        
+
+    # ------------------ KEY INSIGHTS ------------------
+    st.subheader("Key Insights")
+    st.markdown("\n".join(f"- {insight}" for insight in generate_insights(aggregates)))
+
     st.markdown("---")
 
     # ------------------ REVENUE VELOCITY ------------------
     st.subheader("Revenue Trends")
     
     if 'Final Order date' in filtered_df.columns:
-        time_data = filtered_df.groupby(pd.Grouper(key='Final Order date', freq='M'))['Net Revenue'].sum().reset_index()
+        time_data = aggregates['trend']
         
-        fig = px.area(
-            time_data, 
-            x='Final Order date', 
-            y='Net Revenue',
-            template="plotly_white",
-            line_shape='spline'
-        )
-        fig.update_traces(line_color='#0052cc', fillcolor='rgba(0, 82, 204, 0.1)')
+        # WebGL trace: one canvas instead of SVG nodes (GL lines have no spline shape)
+        fig = go.Figure(go.Scattergl(
+            x=time_data['Final Order date'],
+            y=time_data['Net Revenue'],
+            name='Net Revenue',
+            mode='lines',
+            fill='tozeroy',
+            line=dict(color='#0052cc'),
+            fillcolor='rgba(0, 82, 204, 0.1)'
+        ))
         fig.update_layout(
+            template="plotly_white",
             height=400,
             xaxis_title="",
             yaxis_title="Revenue (₹)",
@@ -425,60 +905,51 @@ def main():
     st.markdown("## 🏢 Platform Intelligence")
     st.markdown("---")
 
-    col1, col2 = st.columns([2, 1])
-    
-    with col1:
-        st.markdown("### Performance Matrix")
-        st.caption("Revenue vs. Volume vs. Average Order Value")
-        
-        platform_metrics = filtered_df.groupby('Platform').agg({
-            'Net Revenue': 'sum',
-            'Net Quantity': 'sum',
-            'Final Order date': 'count'
-        }).reset_index()
-        platform_metrics['AOV'] = platform_metrics['Net Revenue'] / platform_metrics['Final Order date']
-        
-        fig_bubble = px.scatter(
-            platform_metrics,
-            x="Net Quantity",
-            y="Net Revenue",
-            size="AOV",
-            color="Platform",
-            hover_name="Platform",
-            text="Platform",
-            size_max=60,
-            template="plotly_white"
-        )
-        fig_bubble.update_traces(textposition='top center')
-        fig_bubble.update_layout(height=500, xaxis_title="Sales Volume (Qty)", yaxis_title="Total Revenue")
-        st.plotly_chart(fig_bubble, use_container_width=True)
+    platform_metrics = aggregates['platforms']
 
-    with col2:
-        st.markdown("### Return Rates")
-        return_data = filtered_df.groupby('Platform').agg({
-            'Sale (Amt.)': 'sum',
-            'Sale Return (Amt.)': 'sum'
-        }).reset_index()
-        
-        return_data['Return Rate (%)'] = (return_data['Sale Return (Amt.)'] / return_data['Sale (Amt.)']) * 100
-        return_data = return_data.sort_values('Return Rate (%)', ascending=True)
-        
-        fig_bar = px.bar(
-            return_data,
-            x='Return Rate (%)',
-            y='Platform',
-            orientation='h',
-            color='Return Rate (%)',
-            color_continuous_scale='RdYlGn_r',
-            text_auto='.1f',
-            template="plotly_white"
-        )
-        fig_bar.update_layout(height=500)
-        st.plotly_chart(fig_bar, use_container_width=True)
+    st.markdown("### Performance Matrix & Return Rates")
+    st.caption("Revenue vs. Volume vs. Average Order Value, and returns as a share of sales")
+    
+    # Both views in one figure: a single Plotly payload and browser mount per rerun
+    return_data = platform_metrics.sort_values('Return Rate (%)', ascending=True)
+    bubble_size = platform_metrics['AOV'].clip(lower=0).fillna(0)
+    palette = px.colors.qualitative.Plotly
+    fig_platforms = make_subplots(
+        rows=1, cols=2, column_widths=[2 / 3, 1 / 3], horizontal_spacing=0.12,
+        subplot_titles=("Performance Matrix", "Return Rates")
+    )
+    fig_platforms.add_trace(go.Scattergl(
+        x=platform_metrics['Net Quantity'],
+        y=platform_metrics['Net Revenue'],
+        mode='markers+text',
+        text=platform_metrics['Platform'],
+        textposition='top center',
+        customdata=platform_metrics[['AOV']],
+        hovertemplate="<b>%{text}</b><br>Volume: %{x:,.0f}<br>Revenue: ₹%{y:,.0f}<br>AOV: ₹%{customdata[0]:,.0f}<extra></extra>",
+        marker=dict(
+            size=bubble_size,
+            sizemode='area',
+            sizeref=2 * max(float(bubble_size.max()), 1.0) / 60 ** 2,
+            color=[palette[i % len(palette)] for i in range(len(platform_metrics))]
+        ),
+        showlegend=False
+    ), row=1, col=1)
+    fig_platforms.add_trace(go.Bar(
+        x=return_data['Return Rate (%)'],
+        y=return_data['Platform'],
+        orientation='h',
+        marker=dict(color=return_data['Return Rate (%)'], colorscale='RdYlGn_r'),
+        texttemplate='%{x:.1f}',
+        showlegend=False
+    ), row=1, col=2)
+    fig_platforms.update_xaxes(title_text="Sales Volume (Qty)", row=1, col=1)
+    fig_platforms.update_yaxes(title_text="Total Revenue", row=1, col=1)
+    fig_platforms.update_xaxes(title_text="Return Rate (%)", row=1, col=2)
+    fig_platforms.update_layout(height=500, template="plotly_white")
+    st.plotly_chart(fig_platforms, use_container_width=True)
 
     st.markdown("### Channel Distribution")
-    tree_data = filtered_df.groupby(['Platform', 'Category'])['Net Revenue'].sum().reset_index()
-    tree_data = tree_data[tree_data['Net Revenue'] > 0]
+    tree_data = aggregates['channel_mix']
     
     fig_tree = px.treemap(
         tree_data,
@@ -495,18 +966,17 @@ def main():
     st.markdown("## 📦 Product Matrix")
     st.markdown("---")
 
-    # Star Products
-    prod_stats = filtered_df.groupby('Product').agg({
-        'Net Revenue': 'sum',
-        'Net Quantity': 'sum'
-    }).sort_values('Net Revenue', ascending=False)
+    # Star Products - one cached per-product table feeds the cards, Pareto and detail table
+    prod_stats = aggregates['products']
     
     if not prod_stats.empty:
         col1, col2, col3 = st.columns(3)
-        top_rev = prod_stats.index[0]
-        top_rev_val = prod_stats.iloc[0]['Net Revenue']
-        top_qty_prod = prod_stats.sort_values('Net Quantity', ascending=False).index[0]
-        top_qty_val = prod_stats.sort_values('Net Quantity', ascending=False).iloc[0]['Net Quantity']
+        # Top by revenue and volume in one O(n) pass each, no sorting
+        top_rev = prod_stats['Net Revenue'].idxmax()
+        top_rev_val = prod_stats.loc[top_rev, 'Net Revenue']
+        qty = prod_stats['Net Quantity']
+        top_qty_prod = qty.idxmax()
+        top_qty_val = qty.max()
         
         with col1:
             st.metric("Highest Revenue SKU", top_rev, f"₹{top_rev_val:,.0f}")
@@ -517,10 +987,12 @@ def main():
 
     # Pareto Chart
     st.markdown("### Revenue Concentration (Pareto)")
-    pareto_data = prod_stats.copy()
+    # Only the plotted top 50 need a running total; the denominator is the full sum
+    total_revenue = prod_stats['Net Revenue'].sum()
+    pareto_data = top_rows(prod_stats, 'Net Revenue', 50)
     pareto_data['Cumulative Revenue'] = pareto_data['Net Revenue'].cumsum()
-    pareto_data['Cumulative %'] = 100 * pareto_data['Cumulative Revenue'] / pareto_data['Net Revenue'].sum()
-    pareto_data = pareto_data.reset_index().head(50)
+    pareto_data['Cumulative %'] = 100 * pareto_data['Cumulative Revenue'] / total_revenue
+    pareto_data = pareto_data.reset_index()
     
     fig_pareto = go.Figure()
     fig_pareto.add_trace(go.Bar(
@@ -548,22 +1020,11 @@ def main():
     st.plotly_chart(fig_pareto, use_container_width=True)
 
     # Detailed Table
-    with st.expander("🔎 View Detailed Product Performance"):
-        st.dataframe(
-            prod_stats.style.background_gradient(subset=['Net Revenue'], cmap='Blues')
-            .format({
-                'Net Revenue': '₹{:,.0f}',
-                'Net Quantity': '{:,.0f}'
-            }),
-            use_container_width=True,
-            height=500
-        )
+    product_table(prod_stats)
 
     # Raw Data Viewer
     st.markdown("---")
-    with st.expander("📋 View Raw Data (Filtered)"):
-        st.caption(f"Showing {len(filtered_df):,} rows (filtered from {len(df):,} total rows)")
-        st.dataframe(filtered_df, use_container_width=True, height=400)
+    raw_data_view(filtered_df, len(df), data_key, filter_key)
     
     # Footer
     st.markdown("---")
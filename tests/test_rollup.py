@@ -0,0 +1,80 @@
+"""The default view is served from the rollup; it must match the raw rows."""
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import streamlit_dashboard as sd
+
+
+def make_workbook(n=600, with_group=True, seed=0):
+    """Bytes of a small 'Final Sale Data' workbook with blank keys and dates"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Transaction Type': rng.choice(['Sale', 'Sale Return'], n),
+        'VchNo': rng.integers(1, 10**6, n),
+        'Item Desc': rng.choice([f'Product {i}' for i in range(20)], n),
+        'Alias': rng.choice([f'SKU{i}' for i in range(20)], n),
+        'Group Name': rng.choice([f'Cat {i}' for i in range(4)], n),
+        'Final Order date ': pd.Timestamp('2024-01-15') + pd.to_timedelta(rng.integers(0, 500, n), unit='D'),
+        'Sale (Qty.)': rng.integers(0, 5, n),
+        'Sale Return (Qty.)': rng.integers(0, 2, n),
+        'Sale (Amt.)': rng.uniform(0, 5000, n).round(2),
+        'Sale Return (Amt.)': rng.uniform(0, 500, n).round(2),
+        'Main Parties': rng.choice(['Amazon Online Sale', 'Flipkart Online Sale', 'Website'], n),
+        'Dispatch Status': 'Delivered',
+    })
+    df.loc[::7, 'Main Parties'] = None
+    df.loc[3::5, 'Group Name'] = None
+    df.loc[::97, 'Final Order date '] = pd.NaT
+    if not with_group:
+        df = df.drop(columns='Group Name')
+    buffer = io.BytesIO()
+    df.to_excel(buffer, sheet_name='Final Sale Data', index=False)
+    return buffer.getvalue()
+
+
+class RollupMatchesRawTest(unittest.TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patcher = mock.patch.object(sd, 'CACHE_DIR', Path(cache_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, data_key, file_bytes):
+        df = sd.load_data(data_key, file_bytes, 'test.xlsx')
+        rollup = sd.get_rollup.__wrapped__(data_key, df)
+        self.assertIsNotNone(rollup)
+
+        # main() uses the rollup only for the full date range, which skips undated rows
+        dates = df['Final Order date']
+        raw = df[dates.notna()]
+
+        np.testing.assert_allclose(sd.overview_kpis(rollup), sd.overview_kpis(raw), rtol=1e-6)
+
+        raw_platforms, rollup_platforms = sd.platform_agg(raw), sd.platform_agg(rollup)
+        self.assertTrue(pd.api.types.is_integer_dtype(rollup_platforms['Orders']))
+        np.testing.assert_array_equal(rollup_platforms['Orders'], raw_platforms['Orders'])
+        np.testing.assert_allclose(rollup_platforms['Net Revenue'], raw_platforms['Net Revenue'], rtol=1e-6)
+
+        raw_trend, rollup_trend = sd.revenue_trend(raw), sd.revenue_trend(rollup)
+        np.testing.assert_allclose(rollup_trend['Net Revenue'], raw_trend['Net Revenue'], rtol=1e-6)
+
+    def test_blank_platform_and_category(self):
+        self.check('blank-keys', make_workbook())
+
+    def test_missing_group_name_column(self):
+        self.check('no-group', make_workbook(with_group=False))
+
+    def test_pandas_fallback(self):
+        with mock.patch.object(sd, 'numbagg', None):
+            self.check('fallback', make_workbook(seed=1))
+
+
+if __name__ == '__main__':
+    unittest.main()